@@ -1,22 +1,37 @@
 # app/config.py
 import os
+from dataclasses import dataclass
+from functools import lru_cache
+
 from dotenv import load_dotenv
 
-# Load variables from .env into environment
-load_dotenv()
 
+# Only this much contract text is ever sent to Gemini. Ingestion stops reading
+# once it has this many characters, and extraction truncates to the same limit.
+MAX_CONTRACT_CHARS = 15000
+
+
+@dataclass(frozen=True, slots=True)
 class Settings:
-    def __init__(self) -> None:
-        # Gemini
-        self.gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
-        self.gemini_model_name: str = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-pro-exp-0801")
-        self.gemini_embed_model: str = os.getenv("GEMINI_EMBED_MODEL", "text-embedding-004")
+    # Gemini
+    gemini_api_key: str
+    gemini_model_name: str
+    gemini_embed_model: str
+    # Upper bound on in-flight Gemini requests per process (rate-limit friendly)
+    gemini_max_concurrency: int
+    # On-disk cache of Gemini responses; empty string (the default) disables it
+    gemini_cache_dir: str
+    # Skip the LLM review for clauses the rules already rate GREEN (non-conservative
+    # profiles). Opt-in: the rule checks are crude keyword matches.
+    llm_skip_green: bool
 
-        # Qdrant
-        self.qdrant_url: str = os.getenv("QDRANT_URL", "")
-        self.qdrant_api_key: str = os.getenv("QDRANT_API_KEY", "")
-        self.qdrant_collection: str = os.getenv("QDRANT_COLLECTION", "contract_precedents")
+    # Qdrant
+    qdrant_url: str
+    qdrant_api_key: str
+    qdrant_collection: str
+    qdrant_grpc_port: int
 
+    def __post_init__(self) -> None:
         # Basic sanity checks (you can relax these if needed)
         if not self.gemini_api_key:
             raise ValueError("GEMINI_API_KEY is not set in the environment / .env file")
@@ -25,4 +40,30 @@ class Settings:
         if not self.qdrant_api_key:
             raise ValueError("QDRANT_API_KEY is not set in the environment / .env file")
 
-settings = Settings()
\ No newline at end of file
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            gemini_api_key=os.getenv("GEMINI_API_KEY", ""),
+            gemini_model_name=os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-pro-exp-0801"),
+            gemini_embed_model=os.getenv("GEMINI_EMBED_MODEL", "text-embedding-004"),
+            gemini_max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")),
+            gemini_cache_dir=os.getenv("GEMINI_CACHE_DIR", ""),
+            llm_skip_green=os.getenv("LLM_SKIP_GREEN", "false").lower() in ("1", "true", "yes"),
+            qdrant_url=os.getenv("QDRANT_URL", ""),
+            qdrant_api_key=os.getenv("QDRANT_API_KEY", ""),
+            qdrant_collection=os.getenv("QDRANT_COLLECTION", "contract_precedents"),
+            qdrant_grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Build the settings once per process.
+    The .env file is only parsed when the environment has not already been
+    populated (e.g. Cloud Run injects variables directly).
+    """
+    if not os.environ.get("CONTRACTLENS_SKIP_DOTENV") and "GEMINI_API_KEY" not in os.environ:
+        load_dotenv()
+
+    return Settings.from_env()
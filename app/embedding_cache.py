@@ -0,0 +1,75 @@
+# app/embedding_cache.py
+from __future__ import annotations
+
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+from cachetools import TTLCache
+
+from . import gemini_client
+
+
+class CachedEmbedder:
+    """
+    In-process LRU + TTL cache in front of the Gemini embedding calls.
+
+    Identical clause text (after trimming and lower-casing) is only embedded
+    once per `ttl` seconds, across requests.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600) -> None:
+        self._cache: TTLCache[str, List[float]] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.strip().lower().encode("utf-8")).hexdigest()
+
+    async def get_embedding(self, text: str) -> List[float]:
+        return (await self.get_embeddings([text]))[0]
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Same contract as gemini_client.get_embeddings; only cache misses hit the API.
+        """
+        keys = [self._key(t) for t in texts]
+
+        with self._lock:
+            vectors: List[Optional[List[float]]] = [self._cache.get(k) for k in keys]
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        with self._lock:
+            self._hits += len(texts) - len(missing)
+            self._misses += len(missing)
+
+        if missing:
+            fetched = await gemini_client.get_embeddings([texts[i] for i in missing])
+            with self._lock:
+                for i, vector in zip(missing, fetched):
+                    vectors[i] = vector
+                    self._cache[keys[i]] = vector
+
+        return vectors  # type: ignore[return-value]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counters and current size, for monitoring.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._cache),
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+embedder = CachedEmbedder()
+
+get_embedding = embedder.get_embedding
+get_embeddings = embedder.get_embeddings
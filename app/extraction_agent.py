@@ -1,77 +1,324 @@
 # app/extraction_agent.py
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
+from pydantic import ValidationError
+
+from .config import MAX_CONTRACT_CHARS
 from .gemini_client import call_gemini_json
 from .models import ExtractedContract
 
 EXTRACTION_SYSTEM = """
 You are a contract analysis engine.
 Extract structured key terms and clauses from the contract text.
-Return ONLY valid JSON matching this schema (do not include any extra keys):
-
-{
-  "parties": ["Party A Ltd", "Party B Ltd"],
-  "effective_date": "YYYY-MM-DD or null",
-  "term_months": 12,
-  "auto_renewal": true,
-  "governing_law": "England and Wales",
-  "contract_type": "saas" | "services" | "employment" | null,
-  "clauses": [
-    {
-      "label": "limitation_of_liability" | "termination" | "governing_law" | "ip" | "other",
-      "raw_text": "exact clause text from the contract",
-      "start_char": 123,
-      "end_char": 456
-    }
-  ]
-}
 
 Rules:
 - If you are not sure about a value, use null (or [] for lists).
+- "effective_date" should be an ISO date (YYYY-MM-DD) or null.
 - "term_months" should be an integer number of months if you can infer it, otherwise null.
 - "auto_renewal" should be true, false or null.
 - "governing_law" should be a simple string like "England and Wales" if you can extract it.
 - "contract_type" should be a best guess: "saas", "services", or "employment", or null if unclear.
 - For clauses, include at least any limitation of liability, termination, and governing law clauses if present.
+- "raw_text" must be the exact clause text from the contract.
 - "start_char" and "end_char" are offsets into the provided contract text string; if you cannot compute them reliably, use null.
 """
 
+# Gemini structured-output schema (OpenAPI subset) mirroring models.ExtractedContract.
+# Sent as responseSchema so the model is constrained to this shape server-side.
+EXTRACTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "parties": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "effective_date": {"type": "STRING", "nullable": True},
+        "term_months": {"type": "INTEGER", "nullable": True},
+        "auto_renewal": {"type": "BOOLEAN", "nullable": True},
+        "governing_law": {"type": "STRING", "nullable": True},
+        "contract_type": {
+            "type": "STRING",
+            "enum": ["saas", "services", "employment"],
+            "nullable": True,
+        },
+        "clauses": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "label": {
+                        "type": "STRING",
+                        "enum": [
+                            "limitation_of_liability",
+                            "termination",
+                            "governing_law",
+                            "ip",
+                            "other",
+                        ],
+                    },
+                    "raw_text": {"type": "STRING"},
+                    "start_char": {"type": "INTEGER", "nullable": True},
+                    "end_char": {"type": "INTEGER", "nullable": True},
+                },
+                "required": ["label", "raw_text"],
+            },
+        },
+    },
+    "required": ["parties", "clauses"],
+}
+
+# Same shape, one element per contract, tagged with the contract's id
+BATCH_EXTRACTION_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "INTEGER"},
+            **EXTRACTION_SCHEMA["properties"],
+        },
+        "required": ["id", *EXTRACTION_SCHEMA["required"]],
+    },
+}
+
+
+# Identical uploads (demos, re-runs with a different risk profile) skip the LLM.
+# Keyed by SHA-256 of the truncated text, most recently used last.
+_EXTRACTION_CACHE_SIZE = 256
+_extraction_cache: OrderedDict[str, ExtractedContract] = OrderedDict()
+
+
+_PROMPT_PREFIX = "\nContract text:\n<contract>\n"
+_PROMPT_SUFFIX = (
+    "\n</contract>\n\n"
+    "Return ONLY the JSON object. Do not include any commentary or Markdown.\n"
+)
+
 
 def _build_user_prompt(contract_text: str) -> str:
     # Truncate to avoid giant prompts
-    truncated = contract_text[:15000]
+    return "".join((_PROMPT_PREFIX, contract_text[:MAX_CONTRACT_CHARS], _PROMPT_SUFFIX))
+
+
+def _build_batch_prompt(contract_texts: List[str]) -> str:
+    documents = orjson.dumps(
+        [{"id": i, "text": t[:MAX_CONTRACT_CHARS]} for i, t in enumerate(contract_texts)]
+    ).decode()
     return f"""
-Contract text:
-<contract>
-{truncated}
-</contract>
+Several independent contracts, as a JSON array of {{"id", "text"}} objects:
+<contracts>
+{documents}
+</contracts>
 
-Return ONLY the JSON object as described. Do not include any commentary or Markdown.
+Extract each contract separately. Return ONLY a JSON array with exactly one object per contract,
+each carrying that contract's "id". "start_char" and "end_char" refer to that contract's own text.
+Do not include any commentary or Markdown.
 """
 
 
-def extract_contract(contract_text: str) -> ExtractedContract:
+class BatchedExtractor:
+    """
+    Coalesces concurrent extraction requests into multi-document Gemini calls.
+
+    Requests arriving within `max_wait` seconds of each other (up to `max_batch`)
+    are sent as one prompt, amortising per-call overhead under concurrent load.
+    A lone request is sent on its own with the single-contract prompt.
+    """
+
+    def __init__(self, max_batch: int = 8, max_wait: float = 0.05) -> None:
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue[Tuple[str, asyncio.Future[ExtractedContract]]]] = None
+        self._worker: Optional[asyncio.Task[None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: set[asyncio.Task[None]] = set()
+
+    async def submit(self, contract_text: str) -> ExtractedContract:
+        loop = asyncio.get_running_loop()
+        # The queue and worker are bound to the running loop, so create them lazily
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+        future: asyncio.Future[ExtractedContract] = loop.create_future()
+        await self._queue.put((contract_text, future))
+        return await future
+
+    async def _collect(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispatch in the background so the next batch can start filling up
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future[ExtractedContract]]]) -> None:
+        if len(batch) == 1:
+            await _resolve(batch[0][1], _extract_single(batch[0][0]))
+            return
+
+        try:
+            raw_items = await call_gemini_json(
+                EXTRACTION_SYSTEM,
+                _build_batch_prompt([text for text, _ in batch]),
+                response_schema=BATCH_EXTRACTION_SCHEMA,
+            )
+            by_id: Dict[int, Dict[str, Any]] = {}
+            duplicate_ids = set()
+            for item in raw_items:
+                item_id = item.pop("id")
+                if item_id in by_id:
+                    duplicate_ids.add(item_id)
+                by_id[item_id] = item
+            # An id answered twice can't be attributed to either contract
+            for item_id in duplicate_ids:
+                del by_id[item_id]
+        except Exception:  # noqa: BLE001
+            # Batch call failed (e.g. truncated output) – retry each contract on its own
+            by_id = {}
+
+        pending = []
+        for i, (text, future) in enumerate(batch):
+            if future.done():
+                continue
+
+            extracted: Optional[ExtractedContract] = None
+            item = by_id.get(i)
+            if item is not None:
+                try:
+                    extracted = ExtractedContract(**item)
+                except ValidationError:
+                    pass
+            if extracted is not None and not _clauses_come_from(extracted, text):
+                # Clauses mixed up with another contract in the batch
+                extracted = None
+
+            if extracted is None:
+                # Missing or invalid element – fall back to a single-contract call
+                pending.append(_resolve(future, _extract_single(text)))
+            else:
+                future.set_result(extracted)
+
+        await asyncio.gather(*pending)
+
+
+    async def aclose(self) -> None:
+        """
+        Stop the collecting worker and any in-flight dispatches (call on shutdown).
+        """
+        tasks = [*self._inflight]
+        if self._worker is not None:
+            tasks.append(self._worker)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+
+
+def _clauses_come_from(extracted: ExtractedContract, contract_text: str) -> bool:
+    """
+    True if every clause's raw_text occurs in the (truncated) contract text,
+    ignoring differences in whitespace.
+    """
+    haystack = " ".join(contract_text[:MAX_CONTRACT_CHARS].split())
+    return all(" ".join(c.raw_text.split()) in haystack for c in extracted.clauses)
+
+
+async def _resolve(future: asyncio.Future[ExtractedContract], coro: Any) -> None:
+    try:
+        result = await coro
+    except Exception as e:  # noqa: BLE001
+        if not future.done():
+            future.set_exception(e)
+    else:
+        if not future.done():
+            future.set_result(result)
+
+
+_batcher = BatchedExtractor()
+
+
+async def close_batcher() -> None:
+    """
+    Stop the extraction batching worker (call on application shutdown).
+    """
+    await _batcher.aclose()
+
+
+async def extract_contract(contract_text: str) -> ExtractedContract:
     """
     Call Gemini to extract key terms and clauses into an ExtractedContract object.
+    Results are cached per distinct (truncated) contract text.
     """
 
+    key = hashlib.sha256(contract_text[:MAX_CONTRACT_CHARS].encode("utf-8")).hexdigest()
+
+    cached = _extraction_cache.get(key)
+    if cached is not None:
+        _extraction_cache.move_to_end(key)
+        return cached.model_copy(deep=True)
+
+    extracted = await _batcher.submit(contract_text)
+
+    _extraction_cache[key] = extracted
+    if len(_extraction_cache) > _EXTRACTION_CACHE_SIZE:
+        _extraction_cache.popitem(last=False)
+
+    return extracted.model_copy(deep=True)
+
+
+def _is_valid_extraction(raw: Any) -> bool:
+    try:
+        ExtractedContract(**raw)
+    except (ValidationError, TypeError):
+        return False
+    return True
+
+
+async def _extract_single(contract_text: str) -> ExtractedContract:
     user_prompt = _build_user_prompt(contract_text)
-    raw = call_gemini_json(EXTRACTION_SYSTEM, user_prompt)
+    raw = await call_gemini_json(
+        EXTRACTION_SYSTEM,
+        user_prompt,
+        response_schema=EXTRACTION_SCHEMA,
+        cacheable=_is_valid_extraction,
+    )
 
     try:
         return ExtractedContract(**raw)
-    except Exception as e:  # noqa: BLE001
-        # Attempt a single self-healing roundtrip to Gemini
+    except ValidationError as e:
+        # The schema fixes the shape but not value formats (e.g. a non-ISO
+        # effective_date), so allow a single self-healing roundtrip
         fix_prompt = f"""
 The following JSON had validation errors in my schema: {e}.
 
 Here is the JSON you produced:
-{json.dumps(raw)}
+{orjson.dumps(raw).decode()}
 
-Please return corrected JSON that strictly matches the schema in the system instruction.
+Please return corrected JSON that follows the rules in the system instruction.
 Return ONLY the corrected JSON object.
 """
-        fixed_raw = call_gemini_json(EXTRACTION_SYSTEM, fix_prompt)
+        fixed_raw = await call_gemini_json(
+            EXTRACTION_SYSTEM,
+            fix_prompt,
+            response_schema=EXTRACTION_SCHEMA,
+            cacheable=_is_valid_extraction,
+        )
         return ExtractedContract(**fixed_raw)
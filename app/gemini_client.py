@@ -1,117 +1,207 @@
 # app/gemini_client.py
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import google.generativeai as genai
+import diskcache
+import httpx
+import orjson
 
-from .config import settings
+from .config import get_settings
 
+settings = get_settings()
 
-# Configure Gemini client once at import
-genai.configure(api_key=settings.gemini_api_key)
 
-# Main text model instance
-_model = genai.GenerativeModel(settings.gemini_model_name)
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
 
+# One pooled client for the whole process: keeps TLS sessions alive and lets
+# concurrent calls share HTTP/2 connections instead of re-handshaking per call.
+_client = httpx.AsyncClient(
+    base_url=GEMINI_API_BASE,
+    headers={"x-goog-api-key": settings.gemini_api_key},
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60),
+    timeout=httpx.Timeout(120.0, connect=10.0),
+)
 
-def call_gemini_json(system_instruction: str, user_prompt: str) -> Dict[str, Any]:
+# Callers fan out with asyncio.gather; this keeps the fan-out within Gemini rate limits.
+_semaphore = asyncio.Semaphore(settings.gemini_max_concurrency)
+
+# Responses are pure functions of (model, input), so re-runs and retries can skip the API.
+# Bounded in size and age: on Cloud Run the cache directory may live in instance memory.
+CACHE_SIZE_LIMIT = 64 * 1024 * 1024  # bytes
+CACHE_EXPIRE = 24 * 3600  # seconds
+
+_cache = (
+    diskcache.Cache(settings.gemini_cache_dir, size_limit=CACHE_SIZE_LIMIT)
+    if settings.gemini_cache_dir
+    else None
+)
+
+
+def _cache_key(*parts: str) -> bytes:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+
+
+# diskcache is synchronous SQLite, so reads and writes run in worker threads
+def _cache_get_many(keys: List[bytes]) -> List[Any]:
+    assert _cache is not None
+    return [_cache.get(k) for k in keys]
+
+
+def _cache_set_many(items: List[Tuple[bytes, Any]]) -> None:
+    assert _cache is not None
+    with _cache.transact():
+        for key, value in items:
+            _cache.set(key, value, expire=CACHE_EXPIRE)
+
+
+async def warm_up() -> None:
+    """
+    Open a connection to the Gemini API ahead of the first real request,
+    so the TCP + TLS handshake is not paid by the first /analyze call.
+    """
+    try:
+        await _client.get(f"/models/{settings.gemini_model_name}")
+    except httpx.HTTPError:
+        # Warm-up is best effort; the real call will surface any problem
+        pass
+
+
+async def close_client() -> None:
+    """
+    Close the pooled HTTP client (call on application shutdown).
+    """
+    await _client.aclose()
+
+
+async def _post(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        async with _semaphore:
+            response = await _client.post(
+                path,
+                content=orjson.dumps(payload),
+                headers={"Content-Type": "application/json"},
+            )
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        raise RuntimeError(
+            f"Gemini request to {path} failed with {e.response.status_code}: {e.response.text}"
+        ) from e
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Gemini request to {path} failed: {e}") from e
+
+    # Parse the raw body directly instead of decoding to str first
+    return orjson.loads(response.content)
+
+
+async def call_gemini_json(
+    system_instruction: str,
+    user_prompt: str,
+    response_schema: Optional[Dict[str, Any]] = None,
+    cacheable: Optional[Callable[[Any], bool]] = None,
+) -> Any:
     """
     Helper to call Gemini and force a pure-JSON response.
-    Returns a Python dict parsed from that JSON.
+    Returns the Python object (usually a dict) parsed from that JSON.
+
+    If `response_schema` is given, Gemini constrains its output to that schema.
+    Responses are only cached when `cacheable` is given and accepts the parsed
+    JSON, so an answer the caller would reject is never replayed.
     """
 
     # We jam the "system" instruction into the same user message for simplicity.
     content = system_instruction.strip() + "\n\n" + user_prompt.strip()
 
-    response = _model.generate_content(
-        contents=[{"role": "user", "parts": [content]}],
-        generation_config={
-            "temperature": 0.2,
-            "response_mime_type": "application/json",
+    key = _cache_key(
+        settings.gemini_model_name,
+        content,
+        orjson.dumps(response_schema).decode() if response_schema is not None else "",
+    )
+    if _cache is not None and cacheable is not None:
+        (cached,) = await asyncio.to_thread(_cache_get_many, [key])
+        if cached is not None:
+            return cached
+
+    generation_config: Dict[str, Any] = {
+        "temperature": 0.2,
+        "responseMimeType": "application/json",
+    }
+    if response_schema is not None:
+        generation_config["responseSchema"] = response_schema
+
+    data = await _post(
+        f"/models/{settings.gemini_model_name}:generateContent",
+        {
+            "contents": [{"role": "user", "parts": [{"text": content}]}],
+            "generationConfig": generation_config,
         },
     )
 
-    # Depending on SDK version, the text may be under .text or .candidates[0].content.parts[0].text
-    text = getattr(response, "text", None)
-    if not text:
-        # Fallback – be defensive
-        try:
-            # Newer SDKs sometimes expose this structure
-            text = response.candidates[0].content.parts[0].text
-        except Exception as e:  # noqa: BLE001
-            raise RuntimeError(f"Could not extract JSON text from Gemini response: {e}") from e
+    try:
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError) as e:
+        raise RuntimeError(f"Could not extract JSON text from Gemini response: {data}") from e
 
     try:
-        return json.loads(text)
-    except json.JSONDecodeError as e:
+        parsed = orjson.loads(text)
+    except orjson.JSONDecodeError as e:
         raise RuntimeError(f"Gemini did not return valid JSON: {e}\nRaw response:\n{text}") from e
 
+    if _cache is not None and cacheable is not None and cacheable(parsed):
+        await asyncio.to_thread(_cache_set_many, [(key, parsed)])
+
+    return parsed
 
-def get_embedding(text: str) -> List[float]:
-    """
-    Get an embedding vector from Gemini embedding model.
 
-    The google-generativeai SDK has changed return shapes across versions, so this
-    function is defensive and handles dict, object, and list responses.
+async def get_embeddings(texts: List[str]) -> List[List[float]]:
     """
-    embed_resp = genai.embed_content(
-        model=settings.gemini_embed_model,
-        content=text,
-    )
+    Embed several texts with a single batchEmbedContents request.
+    Vectors are returned in the same order as the input texts.
+    Texts already in the response cache are not sent again.
+    """
+    if not texts:
+        return []
+
+    model = settings.gemini_embed_model
+    keys = [_cache_key(model, t) for t in texts]
+
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    if _cache is not None:
+        vectors = await asyncio.to_thread(_cache_get_many, keys)
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        data = await _post(
+            f"/models/{model}:batchEmbedContents",
+            {
+                "requests": [
+                    {
+                        "model": f"models/{model}",
+                        "content": {"parts": [{"text": texts[i]}]},
+                    }
+                    for i in missing
+                ]
+            },
+        )
 
-    # Case 1: response is a plain dict
-    if isinstance(embed_resp, dict):
-        maybe_embedding = embed_resp.get("embedding")
-
-        # Most likely shape for you right now:
-        # {"embedding": [float, float, ...]}
-        if isinstance(maybe_embedding, list):
-            return maybe_embedding
-
-        # Alternative shape: {"embedding": {"values": [...]}}
-        if isinstance(maybe_embedding, dict) and "values" in maybe_embedding:
-            return maybe_embedding["values"]
-
-        # Or sometimes: {"data": [{"embedding": {"values": [...]}}]}
-        data = embed_resp.get("data")
-        if isinstance(data, list) and data:
-            first = data[0]
-            if isinstance(first, dict):
-                emb = first.get("embedding")
-                if isinstance(emb, dict) and "values" in emb:
-                    return emb["values"]
-
-        raise RuntimeError(f"Unexpected embedding dict format: {embed_resp}")
-
-    # Case 2: response is a list (e.g. list of embeddings)
-    if isinstance(embed_resp, list):
-        first = embed_resp[0]
-        if isinstance(first, dict):
-            emb = first.get("embedding")
-            if isinstance(emb, list):
-                return emb
-            if isinstance(emb, dict) and "values" in emb:
-                return emb["values"]
-        # Or list of objects with .embedding.values
         try:
-            return first.embedding.values  # type: ignore[attr-defined]
-        except Exception as e:  # noqa: BLE001
-            raise RuntimeError(f"Unexpected embedding list format: {embed_resp}") from e
+            fetched = [e["values"] for e in data["embeddings"]]
+        except (KeyError, TypeError) as e:
+            raise RuntimeError(f"Unexpected batch embedding response format: {data}") from e
 
-    # Case 3: response is an object with .embedding or .values
-    try:
-        # object.embedding is already a list
-        maybe_embedding = getattr(embed_resp, "embedding", None)
-        if isinstance(maybe_embedding, list):
-            return maybe_embedding
-        # object.embedding.values
-        if hasattr(embed_resp, "embedding") and hasattr(embed_resp.embedding, "values"):
-            return embed_resp.embedding.values  # type: ignore[attr-defined]
-    except Exception as e:  # noqa: BLE001
-        raise RuntimeError(f"Unexpected embedding response object format: {embed_resp}") from e
+        for i, vector in zip(missing, fetched):
+            vectors[i] = vector
+        if _cache is not None:
+            await asyncio.to_thread(_cache_set_many, [(keys[i], vectors[i]) for i in missing])
 
-    raise RuntimeError(f"Completely unexpected embedding response format: {embed_resp}")
+    return vectors  # type: ignore[return-value]
 
 
+async def get_embedding(text: str) -> List[float]:
+    """
+    Get an embedding vector from Gemini embedding model.
+    """
+    return (await get_embeddings([text]))[0]
@@ -8,44 +8,73 @@ from fastapi import UploadFile
 from pypdf import PdfReader
 import docx  # python-docx
 
+from .config import MAX_CONTRACT_CHARS
 
-def extract_text_from_pdf(file: UploadFile) -> str:
+
+def extract_text_from_pdf(file: UploadFile, max_chars: int = MAX_CONTRACT_CHARS) -> str:
     """
-    Read a PDF UploadFile and extract text from all pages.
+    Read a PDF UploadFile and extract page text, up to `max_chars` characters.
+    Pages past the budget are never decoded.
     """
-    # Read entire file into memory
-    data = file.file.read()
-    pdf_reader = PdfReader(io.BytesIO(data))
-    texts = []
+    # PdfReader works on the spooled upload directly; no need for an in-memory copy
+    pdf_reader = PdfReader(file.file, strict=False)
 
+    texts = []
+    total = 0
     for page in pdf_reader.pages:
         page_text = page.extract_text() or ""
         texts.append(page_text)
+        total += len(page_text) + 2
+        if total >= max_chars:
+            break
 
     # Join pages with some spacing
-    return "\n\n".join(texts)
+    return "\n\n".join(texts)[:max_chars]
 
 
-def extract_text_from_docx(file: UploadFile) -> str:
+def extract_text_from_docx(file: UploadFile, max_chars: int = MAX_CONTRACT_CHARS) -> str:
     """
-    Read a DOCX UploadFile and extract paragraph text.
+    Read a DOCX UploadFile and extract paragraph text, up to `max_chars` characters.
     """
-    data = file.file.read()
-    document = docx.Document(io.BytesIO(data))
+    document = docx.Document(file.file)
+
+    paragraphs = []
+    total = 0
+    for p in document.paragraphs:
+        if not p.text:
+            continue
+        paragraphs.append(p.text)
+        total += len(p.text) + 1
+        if total >= max_chars:
+            break
 
-    paragraphs = [p.text for p in document.paragraphs if p.text]
-    return "\n".join(paragraphs)
+    return "\n".join(paragraphs)[:max_chars]
+
+
+def extract_text_from_plain(file: UploadFile, max_chars: int = MAX_CONTRACT_CHARS) -> str:
+    """
+    Decode a text-like UploadFile as UTF-8 (up to `max_chars` characters),
+    ignoring undecodable bytes.
+    """
+    # Decode straight from the stream rather than via an intermediate bytes copy
+    wrapper = io.TextIOWrapper(file.file, encoding="utf-8", errors="ignore", newline="")
+    try:
+        return wrapper.read(max_chars)
+    finally:
+        # Detach so the wrapper does not close the underlying upload
+        wrapper.detach()
 
 
-def extract_contract_text(file: UploadFile) -> str:
+def extract_contract_text(file: UploadFile, max_chars: int = MAX_CONTRACT_CHARS) -> str:
     """
     Main dispatcher: choose extraction based on file extension / content type.
     If it's not PDF or DOCX, fall back to treating it as plain text.
+    At most `max_chars` characters are extracted, since nothing beyond that is analysed.
     """
     filename = (file.filename or "").lower()
     content_type = (file.content_type or "").lower()
 
-    extractor: Callable[[UploadFile], str]
+    extractor: Callable[[UploadFile, int], str]
 
     if filename.endswith(".pdf") or "pdf" in content_type:
         extractor = extract_text_from_pdf
@@ -53,7 +82,8 @@ def extract_contract_text(file: UploadFile) -> str:
         extractor = extract_text_from_docx
     else:
         # Fallback: assume it's text-like
-        data = file.file.read()
-        return data.decode("utf-8", errors="ignore")
+        extractor = extract_text_from_plain
 
-    return extractor(file)
+    # Always parse from the start, so the same upload can be read more than once
+    file.file.seek(0)
+    return extractor(file, max_chars)
@@ -1,16 +1,24 @@
 # app/main.py
 from __future__ import annotations
 
-from fastapi import FastAPI, UploadFile, File, Form
+import asyncio
+import gzip
+import hashlib
+import os
+
+import brotli
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
+from pydantic import ValidationError
 
 from .models import AnalyzeResponse
 from .ingestion import extract_contract_text
-from .extraction_agent import extract_contract
+from .extraction_agent import extract_contract, close_batcher
 from .risk_engine import analyse_clauses
 from .report_agent import build_contract_analysis
 from .qdrant_client import ensure_collection
+from .gemini_client import warm_up, close_client
 
 
 app = FastAPI(title="ContractLens")
@@ -27,11 +35,22 @@ app.add_middleware(
 
 
 @app.on_event("startup")
-def on_startup() -> None:
+async def on_startup() -> None:
     """
-    Ensure the Qdrant collection exists when the app starts.
+    Ensure the Qdrant collection exists when the app starts,
+    and pre-open the Gemini connection pool.
     """
-    ensure_collection()
+    await ensure_collection()
+    await warm_up()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    """
+    Stop the extraction batcher and release pooled Gemini connections.
+    """
+    await close_batcher()
+    await close_client()
 
 
 @app.get("/health")
@@ -49,34 +68,35 @@ async def analyze(
     Main analysis endpoint: upload a contract + basic metadata → JSON analysis.
     """
 
-    # 1. Ingest the file into raw text
-    raw_text = extract_contract_text(file)
+    # 1. Ingest the file into raw text (CPU-bound parsing runs off the event loop)
+    raw_text = await asyncio.to_thread(extract_contract_text, file)
 
     # 2. Extract structured data + clauses with Gemini
-    extracted = extract_contract(raw_text)
+    try:
+        extracted = await extract_contract(raw_text)
+    except ValidationError as e:
+        # Gemini's answer still didn't fit ExtractedContract after the repair round
+        raise HTTPException(status_code=502, detail=f"Could not extract contract terms: {e}") from e
 
     # 3. Decide contract_type: use extracted one if present, otherwise user-provided
     final_contract_type = extracted.contract_type or contract_type
 
     # 4. Run risk analysis for the key clause types
-    clause_analyses = analyse_clauses(
+    clause_analyses = await analyse_clauses(
         clauses=extracted.clauses,
         contract_type=final_contract_type,
         risk_profile=risk_profile,
     )
 
     # 5. Build overall contract analysis (summary + key_terms)
-    report = build_contract_analysis(extracted, clause_analyses)
+    report = await build_contract_analysis(extracted, clause_analyses)
 
     return AnalyzeResponse(analysis=report)
 
 
-@app.get("/", response_class=HTMLResponse)
-async def index() -> HTMLResponse:
-    """
-    Single-page UI served by FastAPI itself.
-    """
-    html = """
+# Single-page UI served by FastAPI itself.
+# Encoded once at import; the route only hands out the precomputed bytes.
+_INDEX_HTML = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -700,16 +720,88 @@ async def index() -> HTMLResponse:
       output.innerHTML = html;
     }
 
+    const HTML_ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;' };
+
     function escapeHtml(str) {
       if (!str) return '';
-      return String(str)
-        .replace(/&/g, '&amp;')
-        .replace(/</g, '&lt;')
-        .replace(/>/g, '&gt;');
+      // One regex pass instead of three chained replace() scans
+      return String(str).replace(/[&<>]/g, ch => HTML_ESCAPES[ch]);
     }
   </script>
 </body>
 </html>
 """
-    return HTMLResponse(content=html)
 
+_INDEX_HTML_BYTES = _INDEX_HTML.encode("utf-8")
+_INDEX_DIGEST = hashlib.md5(_INDEX_HTML_BYTES, usedforsecurity=False).hexdigest()
+
+# Compressed once at import; each request just picks a variant.
+# content-coding -> (body, headers), in order of preference.
+_INDEX_VARIANTS: dict[str, tuple[bytes, dict[str, str]]] = {}
+for _coding, _body in (
+    ("br", brotli.compress(_INDEX_HTML_BYTES, quality=11)),
+    ("gzip", gzip.compress(_INDEX_HTML_BYTES, compresslevel=9)),
+    ("identity", _INDEX_HTML_BYTES),
+):
+    _headers = {
+        "Cache-Control": "public, max-age=3600",
+        "ETag": f'"{_INDEX_DIGEST}-{_coding}"',
+        "Vary": "Accept-Encoding",
+    }
+    if _coding != "identity":
+        _headers["Content-Encoding"] = _coding
+    _INDEX_VARIANTS[_coding] = (_body, _headers)
+
+
+def _pick_encoding(accept_encoding: str) -> str:
+    """
+    Choose the preferred index variant the client accepts (q=0 means "not acceptable").
+    "*" only covers codings that are not listed explicitly.
+    """
+    accepted = set()
+    refused = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                pass
+        (accepted if q > 0 else refused).add(coding.strip().lower())
+
+    for coding in ("br", "gzip"):
+        if coding in accepted or ("*" in accepted and coding not in refused):
+            return coding
+    return "identity"
+
+
+@app.get("/", response_class=HTMLResponse)
+async def index(request: Request) -> Response:
+    """
+    Single-page UI served by FastAPI itself.
+    Sends a pre-compressed variant when the browser accepts one, and answers
+    conditional requests with 304 when the browser already has this version.
+    """
+    body, headers = _INDEX_VARIANTS[_pick_encoding(request.headers.get("accept-encoding", ""))]
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if "*" in tags or headers["ETag"] in tags:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="text/html", headers=headers)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
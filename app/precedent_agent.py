@@ -1,25 +1,27 @@
 # app/precedent_agent.py
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
-from .gemini_client import get_embedding
+from .embedding_cache import get_embedding
 from .qdrant_client import search_precedents
 from .models import PrecedentClause
 
 
-def get_precedents_for_clause(
+async def get_precedents_for_clause(
     clause_text: str,
     clause_type: str,
     contract_type: str,
     limit: int = 3,
+    vector: Optional[List[float]] = None,
 ) -> List[PrecedentClause]:
     """
     Embed the clause and retrieve similar precedents from Qdrant.
+    Pass `vector` if the clause has already been embedded (e.g. in a batch).
     """
 
-    emb = get_embedding(clause_text)
-    hits = search_precedents(
+    emb = vector if vector is not None else await get_embedding(clause_text)
+    hits = await search_precedents(
         vector=emb,
         clause_type=clause_type,
         contract_type=contract_type,
@@ -30,14 +32,15 @@ def get_precedents_for_clause(
 
     for hit in hits:
         payload = hit.payload or {}
+        # Payloads are written by our own seed script, so skip pydantic validation
         results.append(
-            PrecedentClause(
+            PrecedentClause.model_construct(
                 id=str(hit.id),
                 clause_type=payload.get("clause_type", ""),
                 contract_type=payload.get("contract_type", None),
                 risk_level=payload.get("risk_level", ""),
                 jurisdiction=payload.get("jurisdiction"),
-                text=payload.get("text", ""),
+                text=payload.get("text_snippet", ""),
             )
         )
 
@@ -1,10 +1,18 @@
 # app/precedents_seed.py
 from __future__ import annotations
 
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Any, Optional
+
+import orjson
 from qdrant_client.models import PointStruct
 
-from .gemini_client import get_embedding
-from .qdrant_client import ensure_collection, add_precedents
+from .config import get_settings
+from .embedding_cache import get_embedding, get_embeddings
+from .gemini_client import close_client
+from .qdrant_client import PRECEDENT_SNIPPET_CHARS, ensure_collection, add_precedents
 
 
 RAW_PRECEDENTS = [
@@ -95,8 +103,65 @@ refund of Fees paid in advance.
     },
 ]
 
+# Vectors for RAW_PRECEDENTS keyed by precedent id, with the text hash and model
+# they were computed from. Commit this file so seeding needs no embedding calls.
+EMBEDDINGS_FILE = Path(__file__).with_name("precedents_embeddings.json")
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def main() -> None:
+
+async def _embed_precedents() -> list[list[float]]:
+    """
+    Return one embedding per RAW_PRECEDENTS entry, reusing stored vectors
+    and only calling Gemini for precedents that are new or whose text changed.
+    """
+    model = get_settings().gemini_embed_model
+    stored: dict[str, Any] = {}
+    if EMBEDDINGS_FILE.exists():
+        stored = orjson.loads(EMBEDDINGS_FILE.read_bytes())
+
+    embeddings: list[Optional[list[float]]] = []
+    for item in RAW_PRECEDENTS:
+        entry = stored.get(item["id"])
+        if entry and entry["hash"] == _text_hash(item["text"]) and entry["model"] == model:
+            embeddings.append(entry["vector"])
+        else:
+            embeddings.append(None)
+
+    stale = [i for i, emb in enumerate(embeddings) if emb is None]
+    if not stale:
+        print(f"Loaded all embeddings from {EMBEDDINGS_FILE.name}.")
+        return embeddings  # type: ignore[return-value]
+
+    print(f"Building embeddings for {len(stale)} new or changed precedents...")
+    texts = [RAW_PRECEDENTS[i]["text"] for i in stale]
+    try:
+        # One batchEmbedContents request for all stale precedents
+        fresh = await get_embeddings(texts)
+    except RuntimeError as e:
+        print(f"Batch embedding failed ({e}); falling back to one request per precedent...")
+        fresh = [await get_embedding(t) for t in texts]
+
+    for i, emb in zip(stale, fresh):
+        embeddings[i] = emb
+
+    # Rewrite the file from the current precedents so removed ones drop out
+    EMBEDDINGS_FILE.write_bytes(
+        orjson.dumps(
+            {
+                item["id"]: {"hash": _text_hash(item["text"]), "model": model, "vector": emb}
+                for item, emb in zip(RAW_PRECEDENTS, embeddings)
+            }
+        )
+    )
+    print(f"Saved embeddings to {EMBEDDINGS_FILE.name}.")
+
+    return embeddings  # type: ignore[return-value]
+
+
+async def main() -> None:
     """
     Seed Qdrant with a handful of precedent clauses.
     Run this once from the project root:
@@ -104,13 +169,13 @@ def main() -> None:
         python -m app.precedents_seed
     """
     print("Ensuring collection exists...")
-    ensure_collection()
+    await ensure_collection()
 
     points: list[PointStruct] = []
 
-    print(f"Building embeddings for {len(RAW_PRECEDENTS)} precedents...")
-    for idx, item in enumerate(RAW_PRECEDENTS):
-        emb = get_embedding(item["text"])
+    embeddings = await _embed_precedents()
+
+    for idx, (item, emb) in enumerate(zip(RAW_PRECEDENTS, embeddings)):
         points.append(
             PointStruct(
                 id=idx,  # Qdrant now expects unsigned int or UUID
@@ -121,6 +186,8 @@ def main() -> None:
                     "risk_level": item["risk_level"],
                     "jurisdiction": item["jurisdiction"],
                     "text": item["text"],
+                    # Short prefix used in prompts, so searches needn't return the full text
+                    "text_snippet": item["text"][:PRECEDENT_SNIPPET_CHARS],
                     "precedent_id": item["id"],  # keep your human-readable ID in payload
                 },
             )
@@ -128,9 +195,11 @@ def main() -> None:
 
 
     print("Upserting precedents into Qdrant...")
-    add_precedents(points)
+    await add_precedents(points)
     print("Seeded precedents successfully.")
 
+    await close_client()
+
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
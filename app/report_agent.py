@@ -1,8 +1,9 @@
 # app/report_agent.py
 from __future__ import annotations
-import json
 from typing import List
 
+import orjson
+
 from .gemini_client import call_gemini_json
 from .models import ExtractedContract, ClauseAnalysis, ContractAnalysis
 
@@ -36,7 +37,7 @@ Rules:
 """
 
 
-def build_contract_analysis(
+async def build_contract_analysis(
     extracted: ExtractedContract,
     clause_analyses: List[ClauseAnalysis],
 ) -> ContractAnalysis:
@@ -53,8 +54,9 @@ def build_contract_analysis(
         for c in clause_analyses
     ]
 
-    extracted_json = json.dumps(extracted.model_dump(), indent=2)
-    clause_summaries_json = json.dumps(clause_summaries, indent=2)
+    # Compact JSON: the model doesn't need pretty-printing
+    extracted_json = extracted.model_dump_json()
+    clause_summaries_json = orjson.dumps(clause_summaries).decode()
 
     user_prompt = f"""
 Structured contract data (JSON):
@@ -66,7 +68,11 @@ Clause analyses (label + risk + explanation):
 Return ONLY the JSON object specified in the system instruction.
 """
 
-    raw = call_gemini_json(SUMMARY_SYSTEM, user_prompt)
+    raw = await call_gemini_json(
+        SUMMARY_SYSTEM,
+        user_prompt,
+        cacheable=lambda r: isinstance(r, dict),
+    )
 
     summary = raw.get("summary", "")
     key_terms = raw.get("key_terms", {})
@@ -1,12 +1,18 @@
 # app/risk_engine.py
 from __future__ import annotations
 
-from typing import List
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from .config import get_settings
 from .models import Clause, ClauseAnalysis
 from .precedent_agent import get_precedents_for_clause
+from .embedding_cache import get_embeddings
 from .gemini_client import call_gemini_json
 
+settings = get_settings()
+
 
 # Simple hard-coded rules / playbook
 PLAYBOOK = {
@@ -48,44 +54,71 @@ Rules:
 """
 
 
+# Keywords for the rule checks below, built once at import (matched against lower-cased text)
+_LIAB_UNLIMITED = ("unlimited",)
+_LIAB_CARVE_OUTS = ("death", "personal injury")
+_LIAB_CAP = ("cap", "maximum", "shall not exceed")
+_GOV_LAW_PREFERRED = ("england", "wales")
+_TERM_AT_WILL = ("immediate", "any reason")
+_TERM_NOTICE = ("days", "months")
+
+
+def _check_liability(text: str) -> str:
+    # Very crude logic:
+    if any(k in text for k in _LIAB_UNLIMITED) and not any(k in text for k in _LIAB_CARVE_OUTS):
+        return "RED"
+    if any(k in text for k in _LIAB_CAP):
+        return "AMBER"
+    # No obvious cap at all → red
+    return "RED"
+
+
+def _check_governing_law(text: str) -> str:
+    if all(k in text for k in _GOV_LAW_PREFERRED):
+        return "GREEN"
+    return "AMBER"
+
+
+def _check_termination(text: str) -> str:
+    if all(k in text for k in _TERM_AT_WILL):
+        return "RED"
+    # If there's a notice period mentioned, treat as amber by default
+    if any(k in text for k in _TERM_NOTICE):
+        return "AMBER"
+    return "AMBER"
+
+
+_RULE_CHECKS: Dict[str, Callable[[str], str]] = {
+    "limitation_of_liability": _check_liability,
+    "governing_law": _check_governing_law,
+    "termination": _check_termination,
+}
+
+
 def basic_rules_risk(clause: Clause, playbook: dict, risk_profile: str) -> str:
     """
     Very simple deterministic checks to get a first-pass risk score.
     You can extend this later; for now it's enough to drive the demo.
     """
-    label = clause.label
-    text = clause.raw_text.lower()
-
-    if label == "limitation_of_liability":
-        # Very crude logic:
-        if "unlimited" in text and "death" not in text and "personal injury" not in text:
-            return "RED"
-        if "cap" in text or "maximum" in text or "shall not exceed" in text:
-            return "AMBER"
-        # No obvious cap at all → red
-        return "RED"
-
-    if label == "governing_law":
-        if "england" in text and "wales" in text:
-            return "GREEN"
+    check = _RULE_CHECKS.get(clause.label)
+    if check is None:
+        # Default
         return "AMBER"
 
-    if label == "termination":
-        if "immediate" in text and "any reason" in text:
-            return "RED"
-        # If there's a notice period mentioned, treat as amber by default
-        if "days" in text or "months" in text:
-            return "AMBER"
-        return "AMBER"
+    return check(clause.raw_text.lower())
 
-    # Default
-    return "AMBER"
+
+def _is_valid_risk_answer(raw: Any) -> bool:
+    return isinstance(raw, dict) and all(
+        k in raw for k in ("risk_level", "explanation", "suggested_text")
+    )
 
 
-def analyse_clause(
+async def analyse_clause(
     clause: Clause,
     contract_type: str,
     risk_profile: str,
+    clause_vector: Optional[List[float]] = None,
 ) -> ClauseAnalysis:
     """
     Run rule-based risk + Gemini reasoning for a single clause.
@@ -95,12 +128,24 @@ def analyse_clause(
     rule_risk = basic_rules_risk(clause, playbook, risk_profile)
 
     # Retrieve similar precedents from Qdrant
-    precedents = get_precedents_for_clause(
+    precedents = await get_precedents_for_clause(
         clause_text=clause.raw_text,
         clause_type=clause.label,
         contract_type=contract_type,
+        vector=clause_vector,
     )
 
+    # Clauses that already match the playbook don't need an LLM review,
+    # unless the customer asked for a conservative one
+    if settings.llm_skip_green and rule_risk == "GREEN" and risk_profile != "conservative":
+        return ClauseAnalysis(
+            clause_label=clause.label,
+            risk_level="GREEN",
+            explanation="Matches preferred playbook.",
+            suggested_text=clause.raw_text,
+            precedent_snippets=[p.text[:200] for p in precedents[:2]],
+        )
+
     precedents_text = "\n\n".join(
         f"- [{p.risk_level}] {p.text}" for p in precedents
     )
@@ -124,7 +169,7 @@ Relevant precedent clauses:
 Return strictly the JSON schema specified in the system instruction.
 """
 
-    raw = call_gemini_json(RISK_SYSTEM, user_prompt)
+    raw = await call_gemini_json(RISK_SYSTEM, user_prompt, cacheable=_is_valid_risk_answer)
 
     return ClauseAnalysis(
         clause_label=clause.label,
@@ -135,18 +180,32 @@ Return strictly the JSON schema specified in the system instruction.
     )
 
 
-def analyse_clauses(
+async def analyse_clauses(
     clauses: List[Clause],
     contract_type: str,
     risk_profile: str,
 ) -> List[ClauseAnalysis]:
     """
     Analyse only the clause types we care about for the MVP.
+    Clauses are independent, so they are analysed concurrently;
+    repeated clauses (same label and wording) are only analysed once.
     """
-    analyses: List[ClauseAnalysis] = []
+    keys: List[Tuple[str, bytes]] = []
+    unique: Dict[Tuple[str, bytes], Clause] = {}
 
     for c in clauses:
         if c.label in {"limitation_of_liability", "governing_law", "termination"}:
-            analyses.append(analyse_clause(c, contract_type, risk_profile))
+            key = (c.label, hashlib.blake2b(c.raw_text.encode("utf-8"), digest_size=16).digest())
+            keys.append(key)
+            unique.setdefault(key, c)
+
+    # Embed every distinct clause in one round-trip rather than one request per clause
+    vectors = await get_embeddings([c.raw_text for c in unique.values()])
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = {
+            key: tg.create_task(analyse_clause(c, contract_type, risk_profile, clause_vector=v))
+            for (key, c), v in zip(unique.items(), vectors)
+        }
 
-    return analyses
+    return [tasks[key].result().model_copy(deep=True) for key in keys]